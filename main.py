@@ -1,5 +1,8 @@
 # %%
+import csv
+import hashlib
 import math
+import os
 from pathlib import Path
 import datetime
 
@@ -7,8 +10,6 @@ import polars as pl
 import altair as alt
 from IPython.display import display
 
-_ = alt.data_transformers.enable("vegafusion")
-
 # Constants from psychometric equation
 CONVERSION_CONSTANT = 0.01157  # c_1 (W m day MJ^-1 mm^-1)
 SPECIFIC_LATENT_HEAT_OF_VAPORIZATION_WATER = 2448  # L_v (MJ Mg^-1)
@@ -22,9 +23,31 @@ EVAPORATION_CONVERSION_CONSTANT = 6.42465e-4  # c_t (mols day mm^-1 m^-2 s^-1)
 IDEAL_GAS_CONSTANT = 8.31446261815324  # R (J mol^-1 K^-1)
 WATER_VAPOR_GAS_CONSTANT = 461.5  # R_v (J kg^-1 K^-1)
 
+# Products of the above that appear in the vectorized expressions
+_EVAP_COEF = (
+    2.6
+    * CONVERSION_CONSTANT
+    * SPECIFIC_LATENT_HEAT_OF_VAPORIZATION_WATER
+    * WATER_DENSITY
+    * PSYCHROMETRIC_CONSTANT
+)  # 2.6 c_1 L_v rho_w gamma
+_CT_LV_RHOW = (
+    CONVERSION_CONSTANT * SPECIFIC_LATENT_HEAT_OF_VAPORIZATION_WATER * WATER_DENSITY
+)  # c_1 L_v rho_w
+_LV_OVER_RV = (
+    SPECIFIC_LATENT_HEAT_OF_VAPORIZATION_WATER * 1000 / WATER_VAPOR_GAS_CONSTANT
+)  # L_v / R_v (K)
+_CT_R = EVAPORATION_CONVERSION_CONSTANT * IDEAL_GAS_CONSTANT  # c_t R
+
+# Reciprocal of the Buck equation's d = 234.5 °C
+_BUCK_INV_D = 1 / 234.5
+
 
 CSV_FILE = "./weather-data.csv"
 
+# Parquet metadata key holding the fingerprint of the cached inputs' query plan
+_INPUTS_CACHE_METADATA_KEY = "evapoflex_inputs_fingerprint"
+
 
 def calculate_saturation_vapor_pressure(T: float) -> float:
     """
@@ -40,7 +63,7 @@ def calculate_saturation_vapor_pressure(T: float) -> float:
 
     # in hPa = kPa/10
     e_s_hPa = 6.1121 * math.exp(
-        (18.678 - T_celsius / 234.5) * T_celsius / (257.14 + T_celsius)
+        T_celsius * (18.678 - T_celsius * _BUCK_INV_D) / (257.14 + T_celsius)
     )
     return e_s_hPa / 10
 
@@ -80,7 +103,7 @@ def calculate_evaporation_rate(
     R_n: float,
     delta: float,
     u_a: float,
-    T_mean: float,
+    e_s: float,
     rel_hum: float,
     c_t: float = CONVERSION_CONSTANT,
     L_v: float = SPECIFIC_LATENT_HEAT_OF_VAPORIZATION_WATER,
@@ -94,7 +117,7 @@ def calculate_evaporation_rate(
         R_n: net radiation above the surface (W m^-2)
         delta: slope of the saturated vapor pressure curve (kPa K^-1)
         u_a: wind speed (m s^-1)
-        T_mean: daily mean temperature (°C)
+        e_s: saturation vapor pressure at the air temperature (kPa)
         rel_hum: relative humidity ratio (0-1)
         c_t: conversion constant (0.01157 W m day MJ^-1 mm^-1)
         L_v: latent heat of vaporization (2448 MJ Mg^-1)
@@ -105,8 +128,7 @@ def calculate_evaporation_rate(
         E_pr: evaporation rate of water surface (mm day^-1)
     """
 
-    e_star = calculate_saturation_vapor_pressure(T=T_mean)
-    D_a = (1 - rel_hum) * e_star
+    D_a = (1 - rel_hum) * e_s
 
     numerator = delta * R_n + 2.6 * c_t * L_v * rho_w * gamma * (1 + 0.54 * u_a) * D_a
     denominator = delta + gamma
@@ -116,32 +138,6 @@ def calculate_evaporation_rate(
     return E_pr
 
 
-def calculate_evaporation_rate_from_kwargs(kwargs: dict[str, float]) -> float:
-    """
-    Extract parameters from kwargs dict and calculate evaporation rate.
-
-    Args:
-        kwargs: Dictionary containing weather data columns:
-            - terrestrial_radiation (W/m²): net radiation above surface
-            - Delta: slope of saturated vapor pressure curve (kPa K^-1)
-            - wind_speed_10m (m/s): wind speed at 10m height
-            - temperature_2m (K): air temperature at 2m height
-            - relative_humidity_2m (frac): relative humidity as fraction
-
-    Returns:
-        Evaporation rate (mm day^-1)
-    """
-    R_n = kwargs["terrestrial_radiation (W/m²)"]
-    delta = kwargs["Delta"]
-    u_a = kwargs["wind_speed_10m (m/s)"]
-    T_mean = kwargs["temperature_2m (K)"]
-    rel_hum = kwargs["relative_humidity_2m (frac)"]
-
-    return calculate_evaporation_rate(
-        R_n=R_n, delta=delta, u_a=u_a, T_mean=T_mean, rel_hum=rel_hum
-    )
-
-
 def calculate_power_per_area(
     evap_rate: float,
     T_air: float,
@@ -170,64 +166,117 @@ def calculate_power_per_area(
     return power_per_area
 
 
-def calculate_power_per_area_from_kwargs(kwargs: dict[str, float]) -> float:
+def _saturation_vapor_pressure_expr(T: pl.Expr) -> pl.Expr:
     """
-    Extract parameters from kwargs dict and calculate power per area.
+    Polars expression form of `calculate_saturation_vapor_pressure`.
 
     Args:
-        kwargs: Dictionary containing calculated data:
-            - evap_rate: evaporation rate (mm day^-1)
-            - temperature_2m (K): air temperature at 2m height
-            - relative_humidity_2m (frac): ambient relative humidity as fraction
-            - rel_hum_wet (optional): relative humidity in saturated zone (defaults to 0.99)
+        T: temperature expression (K)
 
     Returns:
-        Power per area (W m^-2)
+        Saturation vapor pressure expression (kPa)
     """
-    evap_rate = kwargs["evap_rate"]
-    T_air = kwargs["temperature_2m (K)"]
-    rel_hum_wet = kwargs.get("rel_hum_wet", 0.99)
-    rel_hum_air = kwargs["relative_humidity_2m (frac)"]
+    T_celsius = T - 273.15
 
-    return calculate_power_per_area(
-        evap_rate=evap_rate,
-        T_air=T_air,
-        rel_hum_wet=rel_hum_wet,
-        rel_hum_air=rel_hum_air,
+    # in hPa = kPa/10
+    e_s_hPa = (
+        6.1121
+        * (T_celsius * (18.678 - T_celsius * _BUCK_INV_D) / (257.14 + T_celsius)).exp()
     )
+    return e_s_hPa / 10
 
 
-def get_df(path: str | Path | None = None) -> pl.DataFrame:
+def _Delta_expr(*, T: pl.Expr, e_s: pl.Expr) -> pl.Expr:
     """
-    Load and process weather data CSV into analysis DataFrame.
+    Polars expression form of `calculate_Delta`.
 
-    Transforms raw weather data by:
-    - Converting units (temperature to K, wind speed to m/s, humidity to fraction)
-    - Calculating Delta (slope of saturation vapor pressure curve)
-    - Computing evaporation rates using psychrometric equations
-    - Calculating power per area and energy density
+    Args:
+        T: temperature expression (K)
+        e_s: saturation vapor pressure expression (kPa)
+
+    Returns:
+        Slope of saturation vapor pressure curve expression (kPa K^-1)
+    """
+    return _LV_OVER_RV * e_s / T**2
+
+
+def _evaporation_rate_expr(
+    *,
+    R_n: pl.Expr,
+    delta: pl.Expr,
+    u_a: pl.Expr,
+    e_s: pl.Expr,
+    rel_hum: pl.Expr,
+) -> pl.Expr:
+    """
+    Polars expression form of `calculate_evaporation_rate`.
 
     Args:
-        path: Path to CSV file (defaults to CSV_FILE constant)
+        R_n: net radiation above the surface (W m^-2)
+        delta: slope of the saturated vapor pressure curve (kPa K^-1)
+        u_a: wind speed (m s^-1)
+        e_s: saturation vapor pressure at the air temperature (kPa)
+        rel_hum: relative humidity ratio (0-1)
 
     Returns:
-        Processed DataFrame with calculated evaporation rates and power metrics
+        Evaporation rate of water surface expression (mm day^-1)
     """
-    if path is None:
-        path = CSV_FILE
+    D_a = (1 - rel_hum) * e_s
+
+    numerator = delta * R_n + _EVAP_COEF * (1 + 0.54 * u_a) * D_a
+    denominator = delta + PSYCHROMETRIC_CONSTANT
+
+    return numerator / (_CT_LV_RHOW * denominator)
+
+
+def _power_per_area_expr(
+    *,
+    evap_rate: pl.Expr,
+    T_air: pl.Expr,
+    rel_hum_air: pl.Expr,
+    rel_hum_wet: float = 0.99,
+) -> pl.Expr:
+    """
+    Polars expression form of `calculate_power_per_area`.
 
-    data_cols = [
-        "temperature_2m (K)",
-        "Delta",
-        "relative_humidity_2m (frac)",
-        "wind_speed_10m (m/s)",
-        "terrestrial_radiation (W/m²)",
-    ]
+    Args:
+        evap_rate: evaporation rate of water surface (mm day^-1)
+        T_air: temperature of the air (K)
+        rel_hum_air: ambient relative humidity in the air
+        rel_hum_wet: relative humidity in the saturated zone above evaporating water
+
+    Returns:
+        Power per area expression (W m^-2)
+    """
+    return _CT_R * evap_rate * T_air * (rel_hum_wet / rel_hum_air).log()
 
-    df = (
-        pl.read_csv(path, skip_lines=3)
+
+def _scan_inputs(path: str | Path) -> pl.LazyFrame:
+    """
+    Scan the weather data CSV and convert the calculation inputs to SI units.
+
+    Args:
+        path: Path to CSV file
+
+    Returns:
+        LazyFrame with time (UTC-4), temperature (K), relative humidity (frac),
+        wind speed (m/s), and terrestrial radiation (W/m²)
+    """
+    return (
+        pl.scan_csv(
+            path,
+            skip_lines=3,
+            infer_schema=False,
+            schema_overrides={
+                "time": pl.Int64,
+                "temperature_2m (°C)": pl.Float64,
+                "relative_humidity_2m (%)": pl.Float64,
+                "wind_speed_10m (km/h)": pl.Float64,
+                "terrestrial_radiation (W/m²)": pl.Float64,
+            },
+        )
         .with_columns(
-            pl.from_epoch("time") - pl.duration(hours=4),
+            pl.from_epoch(pl.col("time") - 4 * 3600, time_unit="s"),
             (pl.col("temperature_2m (°C)") + 273.15).alias("temperature_2m (K)"),
             (pl.col("wind_speed_10m (km/h)") * 1000 / 3600).alias(
                 "wind_speed_10m (m/s)"
@@ -236,27 +285,131 @@ def get_df(path: str | Path | None = None) -> pl.DataFrame:
                 "relative_humidity_2m (frac)"
             ),
         )
-        .with_columns(
-            pl.col("temperature_2m (K)")
-            .map_elements(lambda T: calculate_Delta(T=T), return_dtype=pl.Float64)
-            .alias("Delta")
-        )
-        .with_columns(
-            pl.struct(data_cols)
-            .map_elements(
-                calculate_evaporation_rate_from_kwargs, return_dtype=pl.Float64
-            )
-            .alias("evap_rate"),
+        .select(
+            "time",
+            "temperature_2m (K)",
+            "relative_humidity_2m (frac)",
+            "wind_speed_10m (m/s)",
+            "terrestrial_radiation (W/m²)",
         )
-        .with_columns(
-            pl.struct(*data_cols, "evap_rate")
-            .map_elements(calculate_power_per_area_from_kwargs, return_dtype=pl.Float64)
-            .alias("power (W/m^2)")
+    )
+
+
+def _scan_cached_inputs(path: str | Path) -> pl.LazyFrame:
+    """
+    Scan the converted calculation inputs from a Parquet cache next to the CSV.
+
+    The cache is (re)written when it is missing, older than the CSV, unreadable, or
+    was produced by a different version of `_scan_inputs` (tracked by a fingerprint
+    of its query plan and schema stored in the Parquet metadata).
+    It is written to a temporary file first and then moved into place, so a failed
+    or interrupted run never leaves a broken cache or stray temporary file behind
+    (barring a hard kill mid-write). If it cannot be written
+    (e.g. the directory is read-only), the CSV is scanned directly.
+
+    Args:
+        path: Path to CSV file
+
+    Returns:
+        LazyFrame with the same columns as `_scan_inputs`
+    """
+    csv_path = Path(path)
+    cache_path = csv_path.with_suffix(".parquet")
+
+    # Identifies the conversion code that produced the cache, so that changes to
+    # `_scan_inputs` invalidate it
+    inputs = _scan_inputs(csv_path)
+    fingerprint = hashlib.sha256(
+        f"{inputs.explain(optimized=False)}\n{inputs.collect_schema()}".encode()
+    ).hexdigest()
+
+    if cache_path.exists() and cache_path.stat().st_mtime >= csv_path.stat().st_mtime:
+        try:
+            metadata = pl.read_parquet_metadata(cache_path)
+        except pl.exceptions.ComputeError:
+            metadata = {}
+        if metadata.get(_INPUTS_CACHE_METADATA_KEY) == fingerprint:
+            return pl.scan_parquet(cache_path)
+
+    # Created by sink_parquet itself, so it gets the usual umask-derived mode
+    tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        inputs.sink_parquet(
+            tmp_path, metadata={_INPUTS_CACHE_METADATA_KEY: fingerprint}
         )
-        .with_columns((pl.col("power (W/m^2)") * 3600 / 1000).alias("energy (kJ/m^2)"))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        return inputs
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    return pl.scan_parquet(cache_path)
+
+
+def get_lf(path: str | Path | None = None, *, cache: bool = False) -> pl.LazyFrame:
+    """
+    Build the lazy pipeline that loads and processes the weather data CSV.
+
+    Transforms raw weather data by:
+    - Converting units (temperature to K, wind speed to m/s, humidity to fraction)
+    - Calculating saturation vapor pressure e_s once per row
+    - Calculating Delta (slope of saturation vapor pressure curve)
+    - Computing evaporation rates using psychrometric equations
+    - Calculating power per area and energy density
+    - Keeping only the converted inputs and calculated columns
+
+    Args:
+        path: Path to CSV file (defaults to CSV_FILE constant)
+        cache: If True, read the converted inputs from a Parquet cache next to the
+            CSV, writing it first if needed (see `_scan_cached_inputs`). Only the
+            inputs are cached; the calculated columns are always recomputed.
+
+    Returns:
+        LazyFrame producing calculated evaporation rates and power metrics
+    """
+    if path is None:
+        path = CSV_FILE
+
+    T = pl.col("temperature_2m (K)")
+    rel_hum = pl.col("relative_humidity_2m (frac)")
+    e_s = pl.col("e_s")
+
+    delta = _Delta_expr(T=T, e_s=e_s)
+    evap_rate = _evaporation_rate_expr(
+        R_n=pl.col("terrestrial_radiation (W/m²)"),
+        delta=delta,
+        u_a=pl.col("wind_speed_10m (m/s)"),
+        e_s=e_s,
+        rel_hum=rel_hum,
+    )
+    power = _power_per_area_expr(evap_rate=evap_rate, T_air=T, rel_hum_air=rel_hum)
+
+    inputs = _scan_cached_inputs(path) if cache else _scan_inputs(path)
+    lf = inputs.with_columns(
+        _saturation_vapor_pressure_expr(T).alias("e_s")
+    ).with_columns(
+        delta.alias("Delta"),
+        evap_rate.alias("evap_rate"),
+        power.alias("power (W/m^2)"),
+        (power * 3600 / 1000).alias("energy (kJ/m^2)"),
     )
 
-    return df
+    return lf
+
+
+def get_df(path: str | Path | None = None, *, cache: bool = False) -> pl.DataFrame:
+    """
+    Load and process weather data CSV into analysis DataFrame.
+
+    Args:
+        path: Path to CSV file (defaults to CSV_FILE constant)
+        cache: Whether to use the Parquet input cache; see `get_lf`
+
+    Returns:
+        Processed DataFrame with calculated evaporation rates and power metrics,
+        as described in `get_lf`
+    """
+    return get_lf(path, cache=cache).collect()
 
 
 def get_lat_lon(path: str | Path | None = None) -> tuple[float, float]:
@@ -272,40 +425,59 @@ def get_lat_lon(path: str | Path | None = None) -> tuple[float, float]:
     if path is None:
         path = CSV_FILE
 
-    df = pl.read_csv(path, n_rows=2, n_threads=1, truncate_ragged_lines=True)
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        row = dict(zip(next(reader), next(reader)))
 
-    row = df.row(0, named=True)
-    return (row["latitude"], row["longitude"])
+    return (float(row["latitude"]), float(row["longitude"]))
 
 
-def plot_df(
-    df: pl.DataFrame,
+def prepare_plot_df(
+    lf: pl.LazyFrame,
     *,
     rolling: str | None = None,
     date_range: tuple[datetime.date, datetime.date] | None = None,
-) -> alt.Chart:
+    every: str = "1d",
+) -> pl.LazyFrame:
     """
-    Create a time series line chart of evaporative power data.
+    Smooth, filter, and downsample evaporative power data for plotting.
 
     Args:
-        df: DataFrame with weather and power calculations
-        rolling: If True, apply 1-week rolling average to smooth data
+        lf: LazyFrame with weather and power calculations
+        rolling: Optional window length (e.g. "1w") of a rolling average starting
+            at each hourly sample, to smooth data
         date_range: Optional tuple of (start_date, end_date) to filter data
+        every: Display resolution; power is averaged over windows of this length
+            so the chart only receives as many points as it can show
 
     Returns:
-        Altair Chart object with time series visualization
+        LazyFrame with the time and power columns to plot
     """
-    (lat, lon) = get_lat_lon()
-
     if rolling is not None:
-        df = (
-            df.rolling("time", period=rolling, offset="0d")
+        lf = (
+            lf.group_by_dynamic("time", every="1h", period=rolling, closed="left")
             .agg(pl.col("power (W/m^2)").mean())
             .filter(pl.col("time") < pl.datetime(year=2025, month=8, day=1))
         )
 
     if date_range is not None:
-        df = df.filter(pl.col("time").is_between(*date_range))
+        lf = lf.filter(pl.col("time").is_between(*date_range))
+
+    return lf.group_by_dynamic("time", every=every).agg(pl.col("power (W/m^2)").mean())
+
+
+def _power_chart(df: pl.DataFrame, *, lat_lon: tuple[float, float]) -> alt.Chart:
+    """
+    Create a time series line chart from prepared plot data.
+
+    Args:
+        df: DataFrame with time and power columns, as from `prepare_plot_df`
+        lat_lon: Tuple of (latitude, longitude) coordinates, as from `get_lat_lon`
+
+    Returns:
+        Altair Chart object with time series visualization
+    """
+    (lat, lon) = lat_lon
 
     return (
         alt.Chart(df)
@@ -326,6 +498,35 @@ def plot_df(
     )
 
 
+def plot_df(
+    df: pl.DataFrame,
+    *,
+    lat_lon: tuple[float, float],
+    rolling: str | None = None,
+    date_range: tuple[datetime.date, datetime.date] | None = None,
+    every: str = "1d",
+) -> alt.Chart:
+    """
+    Create a time series line chart of evaporative power data.
+
+    Args:
+        df: DataFrame with weather and power calculations
+        lat_lon: Tuple of (latitude, longitude) coordinates, as from `get_lat_lon`
+        rolling: Optional window length of a rolling average to smooth data; see
+            `prepare_plot_df`
+        date_range: Optional tuple of (start_date, end_date) to filter data
+        every: Display resolution the data is averaged down to before charting
+
+    Returns:
+        Altair Chart object with time series visualization
+    """
+    plot_data = prepare_plot_df(
+        df.lazy(), rolling=rolling, date_range=date_range, every=every
+    ).collect()
+
+    return _power_chart(plot_data, lat_lon=lat_lon)
+
+
 def main():
     """
     Main entry point that loads data and displays rolling average power chart.
@@ -333,20 +534,30 @@ def main():
     Creates a visualization of evaporative power for Feb-June 2025 period
     with 1-week rolling average smoothing.
     """
-    df = get_df()
-    charts = {
-        "full_year_rolling_month": plot_df(df, rolling="1mo"),
-        "june_2025": plot_df(
-            df,
+    _ = alt.data_transformers.enable("vegafusion")
+
+    lf = get_lf(cache=True)
+    lat_lon = get_lat_lon()
+    plot_lfs = {
+        "full_year_rolling_month": prepare_plot_df(lf, rolling="1mo"),
+        "june_2025": prepare_plot_df(
+            lf,
             rolling="1d",
             date_range=(datetime.date(2025, 6, 1), datetime.datetime(2025, 6, 30)),
+            every="3h",
         ),
     }
-    for name, chart in charts.items():
+    energy_lf = lf.select(energy=pl.col("energy (kJ/m^2)").sum() * 1000)
+
+    # Collect all plans together so the shared scan of the cached inputs runs once
+    (*plot_dfs, energy_df) = pl.collect_all([*plot_lfs.values(), energy_lf])
+
+    for name, plot_data in zip(plot_lfs, plot_dfs):
+        chart = _power_chart(plot_data, lat_lon=lat_lon)
         _ = display(chart)
         chart.save(f"power_{name}.pdf")
 
-    total_energy = df.select(energy=pl.col("power (W/m^2)").sum() * 3600).item()
+    total_energy = energy_df.item()
     print(f"Total energy per area for the year: {total_energy} J/m^2")
 
 
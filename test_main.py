@@ -0,0 +1,61 @@
+import polars as pl
+import pytest
+
+import main
+
+TEMPERATURES = [263.15, 273.15, 288.15, 303.15, 313.15]  # K
+REL_HUMS = [0.2, 0.5, 0.95]
+
+
+def _eval(expr: pl.Expr) -> float:
+    return pl.select(expr).item()
+
+
+@pytest.mark.parametrize("T", TEMPERATURES)
+def test_saturation_vapor_pressure_expr(T: float):
+    expected = main.calculate_saturation_vapor_pressure(T)
+    actual = _eval(main._saturation_vapor_pressure_expr(pl.lit(T)))
+    assert actual == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize("T", TEMPERATURES)
+def test_Delta_expr(T: float):
+    e_s = main.calculate_saturation_vapor_pressure(T)
+    expected = main.calculate_Delta(T=T, e_s=e_s)
+    actual = _eval(main._Delta_expr(T=pl.lit(T), e_s=pl.lit(e_s)))
+    assert actual == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize("T", TEMPERATURES)
+@pytest.mark.parametrize("rel_hum", REL_HUMS)
+def test_evaporation_rate_and_power_exprs(T: float, rel_hum: float):
+    R_n = 350.0
+    u_a = 3.0
+    e_s = main.calculate_saturation_vapor_pressure(T)
+    delta = main.calculate_Delta(T=T, e_s=e_s)
+
+    expected_evap = main.calculate_evaporation_rate(
+        R_n=R_n, delta=delta, u_a=u_a, e_s=e_s, rel_hum=rel_hum
+    )
+    actual_evap = _eval(
+        main._evaporation_rate_expr(
+            R_n=pl.lit(R_n),
+            delta=pl.lit(delta),
+            u_a=pl.lit(u_a),
+            e_s=pl.lit(e_s),
+            rel_hum=pl.lit(rel_hum),
+        )
+    )
+    assert actual_evap == pytest.approx(expected_evap, rel=1e-12)
+
+    expected_power = main.calculate_power_per_area(
+        evap_rate=expected_evap, T_air=T, rel_hum_wet=0.99, rel_hum_air=rel_hum
+    )
+    actual_power = _eval(
+        main._power_per_area_expr(
+            evap_rate=pl.lit(expected_evap),
+            T_air=pl.lit(T),
+            rel_hum_air=pl.lit(rel_hum),
+        )
+    )
+    assert actual_power == pytest.approx(expected_power, rel=1e-12)